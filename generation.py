@@ -0,0 +1,96 @@
+import datetime
+import numpy as np
+
+from geometry import seconds_to_timestamps
+from gpx_io import fetch_round_trip_route, parse_gpx, build_gpx
+from physiology import physiological_model
+from sampling import simulate_auto_pause, apply_smart_recording
+from speed_model import create_route_speed_profile, interpolate_track
+
+# GPX track type of each sport
+ACTIVITY_TYPES = {
+    'running': 'foot_walking',
+    'cycling': 'cycling-road',
+}
+
+# Defaults for generate(), override any of them in the config passed in
+DEFAULT_CONFIG = {
+    'route_points': None,  # List of dictionaries with 'lat', 'lon', 'ele'
+    'route_gpx': None,  # OpenRouteService GPX data, used when route_points is None
+    'start_coords': (10.705898, 59.914428),  # (longitude, latitude), fetched when neither route is given
+    'api_key': '',
+    'route_length': 8000,  # meters
+    'num_points': 5,
+    'sport': 'running',  # 'running' or 'cycling'
+    'activity_type': None,  # GPX track type, taken from ACTIVITY_TYPES[sport] when None
+    'avg_speed': 1000 / 240,  # m/s, 4 min/km
+    'avg_bpm': 100,
+    'avg_cadence': 80,
+    'start_time': datetime.datetime(2024, 12, 2, 6, 5, 38),
+    'smart_recording': True,
+    'auto_pause': True,
+    'seed': None,  # Same seed and config give the same GPX
+}
+
+
+def resolve_config(config):
+    """
+    Merges a config with DEFAULT_CONFIG.
+
+    :param config: Dictionary with any of the keys of DEFAULT_CONFIG
+    :return: New dictionary with every key of DEFAULT_CONFIG, activity_type filled in from sport
+    """
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f'Unknown config keys: {", ".join(sorted(unknown))}')
+    resolved = dict(DEFAULT_CONFIG)
+    resolved.update(config)
+    if resolved['activity_type'] is None:
+        if resolved['sport'] not in ACTIVITY_TYPES:
+            raise ValueError(f'Unknown sport: {resolved["sport"]}')
+        resolved['activity_type'] = ACTIVITY_TYPES[resolved['sport']]
+    return resolved
+
+
+def generate(config=None):
+    """
+    Generates a GPX track and returns it as bytes.
+
+    Everything a run needs is taken from config or created locally, including
+    its own random Generator, so concurrent calls (e.g. from the threads of a
+    web server) don't affect each other. Nothing is plotted or written to disk.
+
+    :param config: Dictionary with any of the keys of DEFAULT_CONFIG
+    :return: GPX document as UTF-8 encoded bytes
+    """
+    config = resolve_config(config or {})
+    rng = np.random.default_rng(config['seed'])
+
+    points = config['route_points']
+    if points is None:
+        gpx_data = config['route_gpx']
+        if gpx_data is None:
+            gpx_data = fetch_round_trip_route(config['start_coords'], config['api_key'],
+                                              config['route_length'], config['num_points'], verbose=False)
+        points = parse_gpx(gpx_data, verbose=False)
+    if len(points) < 2:
+        raise ValueError('Route needs at least two points.')
+
+    # The track stays in numpy arrays until the GPX document is built
+    speed_profile, distances = create_route_speed_profile(points, config['avg_speed'], sport=config['sport'])
+    lat, lon, ele = interpolate_track(points, distances)
+    stops = simulate_auto_pause(lat, lon, rng=rng) if config['auto_pause'] else np.zeros(len(lat))
+    bpm_profile, cadence_profile = physiological_model(lat, lon, ele, config['avg_speed'], config['avg_bpm'],
+                                                      config['avg_cadence'], stops=stops, rng=rng,
+                                                      sport=config['sport'])
+    seconds = np.arange(len(lat), dtype=float)
+
+    if config['smart_recording']:
+        seconds, recorded, _ = apply_smart_recording(lat, lon, ele, seconds, stops=stops)
+    else:
+        seconds = seconds + np.cumsum(stops)
+        recorded = np.arange(len(lat))
+
+    timestamps = seconds_to_timestamps(seconds[recorded], config['start_time'])
+    return build_gpx(lat[recorded], lon[recorded], ele[recorded], timestamps, bpm_profile[recorded],
+                     cadence_profile[recorded], activity_type=config['activity_type'])
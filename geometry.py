@@ -0,0 +1,137 @@
+import datetime
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # Mean earth radius in meters
+AUTO_PAUSE_SPEED = 0.5  # m/s, slower intervals count as paused when the pauses are unknown
+
+
+def points_to_arrays(points):
+    """
+    Converts a list of point dictionaries into columnar numpy arrays.
+
+    :param points: List of dictionaries with 'lat', 'lon', 'ele'
+    :return: Tuple of (lat, lon, ele) numpy arrays
+    """
+    lat = np.fromiter((p['lat'] for p in points), dtype=float, count=len(points))
+    lon = np.fromiter((p['lon'] for p in points), dtype=float, count=len(points))
+    ele = np.fromiter((p['ele'] for p in points), dtype=float, count=len(points))
+    return lat, lon, ele
+
+
+def timestamps_to_seconds(timestamps):
+    """
+    Converts a list of datetime objects into seconds since the first timestamp.
+
+    :param timestamps: List of datetime objects
+    :return: Numpy array of elapsed seconds
+    """
+    if not timestamps:
+        return np.zeros(0)
+    start = timestamps[0]
+    return np.fromiter(((ts - start).total_seconds() for ts in timestamps), dtype=float, count=len(timestamps))
+
+
+def seconds_to_timestamps(seconds, start_time):
+    """
+    Converts elapsed seconds into a list of datetime objects.
+
+    :param seconds: Numpy array of elapsed seconds
+    :param start_time: Datetime object of second 0
+    :return: List of datetime objects
+    """
+    return [start_time + datetime.timedelta(seconds=value) for value in seconds.tolist()]
+
+
+def haversine_distances(lat, lon):
+    """
+    Calculates the distance between consecutive points.
+
+    :param lat: Numpy array of latitudes in degrees
+    :param lon: Numpy array of longitudes in degrees
+    :return: Numpy array of len(lat) - 1 distances in meters
+    """
+    lat_rad = np.radians(lat)
+    dlat = np.diff(lat_rad)
+    dlon = np.radians(np.diff(lon))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def compass_bearings(lat, lon):
+    """
+    Calculates the initial compass bearing between consecutive points.
+
+    Vectorized counterpart of calculate_initial_compass_bearing.
+
+    :param lat: Numpy array of latitudes in degrees
+    :param lon: Numpy array of longitudes in degrees
+    :return: Numpy array of len(lat) - 1 bearings in degrees [0, 360)
+    """
+    lat1 = np.radians(lat[:-1])
+    lat2 = np.radians(lat[1:])
+    diff_long = np.radians(np.diff(lon))
+
+    x = np.sin(diff_long) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(diff_long)
+
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def heading_difference(bearing_a, bearing_b):
+    """
+    Calculates the absolute difference between two bearings.
+
+    :param bearing_a: Bearing(s) in degrees
+    :param bearing_b: Bearing(s) in degrees
+    :return: Absolute heading change in degrees [0, 180]
+    """
+    return np.abs((np.asarray(bearing_b) - np.asarray(bearing_a) + 180) % 360 - 180)
+
+
+def moving_average(values, window):
+    """
+    Smooths an array with a centered moving average, keeping its length.
+
+    :param values: Numpy array of values
+    :param window: Window size in samples
+    :return: Numpy array of smoothed values
+    """
+    if window <= 1 or len(values) < 2:
+        return values
+    kernel = np.ones(window) / window
+    padded = np.pad(values, (window // 2, window - 1 - window // 2), mode='edge')
+    return np.convolve(padded, kernel, mode='valid')
+
+
+def track_summary(lat, lon, seconds, paused_seconds=None):
+    """
+    Summarizes distance, time and average speed of a track.
+
+    When the pauses are known, the moving time is the elapsed time without
+    them. Otherwise intervals slower than AUTO_PAUSE_SPEED count as paused,
+    like on a recording from a device. Missing times (NaN) are left out.
+
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param seconds: Numpy array of elapsed seconds
+    :param paused_seconds: Numpy array of total seconds paused up to each point, e.g. np.cumsum(stops)
+    :return: Dictionary with 'points', 'distance', 'elapsed_time', 'moving_time', 'avg_speed'
+    """
+    distances = haversine_distances(lat, lon)
+    dt = np.diff(seconds)
+
+    if paused_seconds is None:
+        moving_time = float(dt[distances > AUTO_PAUSE_SPEED * dt].sum())
+    else:
+        moving_time = float(np.nansum(dt - np.diff(paused_seconds)))
+    distance = float(distances.sum())
+    valid = seconds[np.isfinite(seconds)]
+
+    return {
+        'points': len(seconds),
+        'distance': distance,
+        'elapsed_time': float(valid.max() - valid.min()) if len(valid) else 0.0,
+        'moving_time': moving_time,
+        'avg_speed': distance / moving_time if moving_time > 0 else 0.0
+    }
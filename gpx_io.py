@@ -0,0 +1,154 @@
+import numpy as np
+import requests
+from lxml import etree
+
+
+def fetch_round_trip_route(start_coords, api_key, route_length, num_points=5, verbose=True):
+    """
+    Fetches a round trip route from OpenRouteService API in GPX format.
+    
+    :param start_coords: Tuple of (longitude, latitude)
+    :param api_key: OpenRouteService API key
+    :param route_length: Desired length of the route in meters
+    :param num_points: Number of via points to use in the route
+    :param verbose: Whether to print progress
+    :return: GPX data as a string
+    """
+    url = ''
+    # For cycling routes, uncomment the following line and comment out the above line
+    # url = 'https://api.openrouteservice.org/v2/directions/cycling-road/gpx?gpxType=track'
+    
+    headers = {
+        'Authorization': api_key,
+        'Content-Type': 'application/json'
+    }
+    payload = {
+        'coordinates': [list(start_coords)],
+        'options': {
+            'round_trip': {
+                'length': route_length,
+                'points': num_points
+            }
+        },
+        'elevation': True,
+        'instructions': False,
+        'geometry_simplify': False
+    }
+    response = requests.post(url, json=payload, headers=headers)
+    if response.status_code == 200:
+        if verbose:
+            print('GPX data fetched successfully.')
+        return response.text
+    else:
+        raise Exception(f'Error fetching route: {response.status_code} - {response.text}')
+
+
+def parse_gpx(gpx_data, verbose=True):
+    """
+    Parses the GPX data to extract coordinates and elevations.
+    
+    :param gpx_data: GPX data as a string
+    :param verbose: Whether to print skipped points and the number of parsed points
+    :return: List of dictionaries with 'lat', 'lon', 'ele'
+    """
+    # Parse the GPX XML
+    root = etree.fromstring(gpx_data.encode('utf-8'))
+    
+    # Find all rtept elements regardless of namespace
+    rtepts = root.findall('.//{*}rtept')
+    
+    points = []
+    for pt in rtepts:
+        lat = pt.get('lat')
+        lon = pt.get('lon')
+        ele_elem = pt.find('{*}ele')
+        ele_val = ele_elem.text if ele_elem is not None else '0'
+        
+        # Convert to float
+        try:
+            lat = float(lat)
+            lon = float(lon)
+            ele_val = float(ele_val)
+        except ValueError:
+            if verbose:
+                print(f"Invalid coordinate or elevation value: lat={lat}, lon={lon}, ele={ele_val}. Skipping point.")
+            continue
+        
+        points.append({'lat': lat, 'lon': lon, 'ele': ele_val})
+    
+    if verbose:
+        print(f'Parsed {len(points)} track points from GPX data.')
+    return points
+
+
+def build_gpx(lat, lon, ele, timestamps, bpm_profile, cadence_profile, activity_type='foot_walking'):
+    """
+    Builds a GPX document with the given points and timestamps, including heart rate and cadence.
+    
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param ele: Numpy array of elevations
+    :param timestamps: List of datetime objects
+    :param bpm_profile: Numpy array of BPM values
+    :param cadence_profile: Numpy array of cadence values
+    :param activity_type: Track type, e.g. "foot_walking" or "cycling-road"
+    :return: GPX document as UTF-8 encoded bytes
+    """
+    NSMAP = {
+        None: "http://www.topografix.com/GPX/1/1",
+        'ns3': "http://www.garmin.com/xmlschemas/TrackPointExtension/v1",
+        'ns2': "http://www.garmin.com/xmlschemas/GpxExtensions/v3",
+        'xsi': "http://www.w3.org/2001/XMLSchema-instance"
+    }
+    
+    # Create root element
+    gpx = etree.Element('gpx', nsmap=NSMAP, version="1.1", creator="Garmin Connect")
+    gpx.set("{http://www.w3.org/2001/XMLSchema-instance}schemaLocation",
+            "http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd "
+            "http://www.garmin.com/xmlschemas/GpxExtensions/v3 http://www.garmin.com/xmlschemas/GpxExtensionsv3.xsd "
+            "http://www.garmin.com/xmlschemas/TrackPointExtension/v1 http://www.garmin.com/xmlschemas/TrackPointExtensionv1.xsd")
+    
+    # Add metadata
+    metadata = etree.SubElement(gpx, 'metadata')
+    link = etree.SubElement(metadata, 'link', href="connect.garmin.com")
+    text = etree.SubElement(link, 'text')
+    text.text = "Garmin Connect"
+    time_elem = etree.SubElement(metadata, 'time')
+    time_elem.text = timestamps[0].isoformat() + 'Z'
+    
+    # Create track
+    trk = etree.SubElement(gpx, 'trk')
+    name = etree.SubElement(trk, 'name')
+    name.text = "Generated Route"
+    trk_type = etree.SubElement(trk, 'type')
+    trk_type.text = activity_type
+    
+    # Create track segment
+    trkseg = etree.SubElement(trk, 'trkseg')
+    
+    rows = zip(lat.tolist(), lon.tolist(), ele.tolist(), timestamps,
+               np.asarray(bpm_profile, dtype=int).tolist(), np.asarray(cadence_profile, dtype=int).tolist())
+    for point_lat, point_lon, point_ele, ts, bpm, cad in rows:
+        trkpt = etree.SubElement(trkseg, 'trkpt', lat=f"{point_lat}", lon=f"{point_lon}")
+        
+        # Elevation
+        ele_elem = etree.SubElement(trkpt, 'ele')
+        ele_elem.text = f"{point_ele:.1f}"
+        
+        # Time
+        time_point = etree.SubElement(trkpt, 'time')
+        time_point.text = ts.isoformat() + 'Z'
+        
+        # Extensions
+        extensions = etree.SubElement(trkpt, 'extensions')
+        tpe = etree.SubElement(extensions, '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}TrackPointExtension')
+        
+        # Heart Rate
+        hr_elem = etree.SubElement(tpe, '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}hr')
+        hr_elem.text = str(bpm)
+        
+        # Cadence
+        cad_elem = etree.SubElement(tpe, '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}cad')
+        cad_elem.text = str(cad)
+    
+    return etree.tostring(gpx, pretty_print=True, xml_declaration=True, encoding='UTF-8')
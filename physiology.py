@@ -0,0 +1,198 @@
+import numpy as np
+from scipy.signal import lfilter
+
+from geometry import haversine_distances, moving_average
+from speed_model import cycling_power
+
+# Heart rate response
+HR_TAU = 30.0  # seconds, time constant of the heart rate response
+HR_START_OFFSET = -20  # bpm relative to the average at the start
+HR_SPEED_GAIN = 10.0  # bpm per m/s above average speed
+HR_GRADE_GAIN = 250.0  # bpm per unit grade (2.5 bpm per % grade)
+HR_POWER_GAIN = 30.0  # bpm per multiple of the average power above it (cycling)
+HR_DRIFT = 5.0  # bpm of cardiac drift over the whole session
+MIN_BPM = 60
+MAX_BPM = 200
+
+# Cadence
+STRIDE_SPEED_EXPONENT = 0.5  # stride length grows with the square root of speed
+STRIDE_GRADE_FACTOR = 1.5  # relative stride shortening per unit uphill grade
+MIN_CADENCE = 30
+MAX_CADENCE = 150
+COASTING_POWER = 0.15  # fraction of the average power below which a cyclist stops pedaling
+CYCLING_CADENCE_GRADE_FACTOR = 1.0  # relative cadence drop per unit uphill grade
+
+# Smoothing windows
+GRADE_WINDOW = 15  # seconds
+SPEED_WINDOW = 5  # seconds
+MAX_GRADE = 0.3
+
+
+def track_speed_and_grade(lat, lon, ele, interval_seconds=1):
+    """
+    Derives speed and grade at every point of an interpolated track.
+
+    :param lat: Numpy array of latitudes, one every interval_seconds
+    :param lon: Numpy array of longitudes
+    :param ele: Numpy array of elevations
+    :param interval_seconds: Seconds between consecutive points
+    :return: Tuple of (speed, grade) numpy arrays with one value per point
+    """
+    if len(lat) < 2:
+        return np.zeros(len(lat)), np.zeros(len(lat))
+
+    distances = haversine_distances(lat, lon)
+    speed = distances / interval_seconds
+    speed = np.concatenate((speed[:1], speed))
+
+    # Grade over the smoothing window, so elevation steps between route vertices don't spike
+    climb = moving_average(np.concatenate(([0.0], np.diff(ele))), GRADE_WINDOW)
+    run = moving_average(np.concatenate((distances[:1], distances)), GRADE_WINDOW)
+    grade = np.divide(climb, run, out=np.zeros_like(climb), where=run > 0)
+    grade = np.clip(grade, -MAX_GRADE, MAX_GRADE)
+
+    return moving_average(speed, SPEED_WINDOW), grade
+
+
+def relative_power(speed, grade):
+    """
+    Cycling power relative to the average power while moving.
+
+    :param speed: Numpy array of speeds in m/s, 0 while stopped
+    :param grade: Numpy array of grades (rise over run)
+    :return: Numpy array of relative power, 0 while coasting or stopped
+    """
+    power = np.maximum(cycling_power(speed, grade), 0)
+    moving = speed > 0
+    average = power[moving].mean() if moving.any() else 0.0
+    return power / average if average > 0 else np.zeros_like(power)
+
+
+def create_bpm_profile(speed, grade, avg_speed, avg_bpm, interval_seconds=1, rng=None, sport='running'):
+    """
+    Creates a BPM profile that lags behind the effort like a real heart rate.
+
+    The target heart rate follows the effort, speed and grade for running and
+    power for cycling (where speed says little, descents are fast and easy).
+    The actual heart rate approaches it through a first-order response with
+    time constant HR_TAU.
+
+    The samples must be evenly spaced in time, including any stops, which
+    are samples with zero speed and grade.
+
+    :param speed: Numpy array of speeds in m/s
+    :param grade: Numpy array of grades (rise over run)
+    :param avg_speed: Average speed in meters per second
+    :param avg_bpm: Average heart rate in bpm
+    :param interval_seconds: Seconds between consecutive samples
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :param sport: 'running' or 'cycling'
+    :return: Numpy array of BPM values
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    num_samples = len(speed)
+    drift = np.linspace(0, HR_DRIFT, num_samples)
+    if sport == 'running':
+        target = avg_bpm + HR_SPEED_GAIN * (speed - avg_speed) + HR_GRADE_GAIN * grade + drift
+    elif sport == 'cycling':
+        target = avg_bpm + HR_POWER_GAIN * (relative_power(speed, grade) - 1) + drift
+    else:
+        raise ValueError(f'Unknown sport: {sport}')
+    target = np.clip(target, MIN_BPM, MAX_BPM)
+
+    # y[n] = alpha * y[n-1] + (1 - alpha) * x[n], starting below the average
+    alpha = np.exp(-interval_seconds / HR_TAU)
+    initial = avg_bpm + HR_START_OFFSET
+    bpm, _ = lfilter([1 - alpha], [1, -alpha], target, zi=[alpha * initial])
+
+    bpm += rng.integers(-1, 2, size=num_samples)
+    return np.clip(bpm, MIN_BPM, MAX_BPM)
+
+
+def create_cadence_profile(speed, grade, avg_speed, avg_cadence, rng=None):
+    """
+    Creates a cadence profile from speed and stride length.
+
+    Stride length is chosen so avg_speed gives avg_cadence, grows with speed
+    and shortens uphill.
+
+    :param speed: Numpy array of speeds in m/s
+    :param grade: Numpy array of grades (rise over run)
+    :param avg_speed: Average speed in meters per second
+    :param avg_cadence: Average cadence in strides per minute
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :return: Numpy array of cadence values
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    base_stride = avg_speed * 60 / avg_cadence
+    relative_speed = np.maximum(speed, 0.1) / avg_speed
+    stride = base_stride * relative_speed ** STRIDE_SPEED_EXPONENT * (1 - STRIDE_GRADE_FACTOR * np.maximum(grade, 0))
+    cadence = 60 * speed / stride
+
+    cadence += rng.integers(-1, 2, size=len(speed))
+    return np.clip(cadence, MIN_CADENCE, MAX_CADENCE)
+
+
+def create_cycling_cadence_profile(speed, grade, avg_cadence, rng=None):
+    """
+    Creates a cycling cadence profile.
+
+    Riders shift gears to hold their cadence, so it only drops on steep
+    climbs, and it is 0 while coasting (e.g. on descents).
+
+    :param speed: Numpy array of speeds in m/s
+    :param grade: Numpy array of grades (rise over run)
+    :param avg_cadence: Average pedaling cadence in rpm
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :return: Numpy array of cadence values
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    cadence = avg_cadence * (1 - CYCLING_CADENCE_GRADE_FACTOR * np.maximum(grade, 0))
+
+    cadence += rng.integers(-1, 2, size=len(speed))
+    cadence = np.clip(cadence, MIN_CADENCE, MAX_CADENCE)
+    return np.where(relative_power(speed, grade) < COASTING_POWER, 0, cadence)
+
+
+def physiological_model(lat, lon, ele, avg_speed, avg_bpm, avg_cadence, stops=None, interval_seconds=1, rng=None,
+                        sport='running'):
+    """
+    Computes heart rate and cadence for every point of an interpolated track.
+
+    Heart rate runs on the elapsed time, so it recovers during stops
+    (e.g. auto-pauses) instead of carrying straight on after them.
+
+    :param lat: Numpy array of latitudes, one every interval_seconds
+    :param lon: Numpy array of longitudes
+    :param ele: Numpy array of elevations
+    :param avg_speed: Average speed in meters per second
+    :param avg_bpm: Average heart rate in bpm
+    :param avg_cadence: Average cadence in strides per minute (running) or rpm (cycling)
+    :param stops: Numpy array of seconds stopped before each point from simulate_auto_pause, None for no stops
+    :param interval_seconds: Seconds between consecutive points
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :param sport: 'running' or 'cycling'
+    :return: Tuple of (bpm, cadence) numpy arrays with one value per point
+    """
+    speed, grade = track_speed_and_grade(lat, lon, ele, interval_seconds)
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # Rest samples with zero effort fill the stops, so the heart rate filter sees even time steps
+    rest_samples = np.zeros(len(speed)) if stops is None else np.rint(np.asarray(stops) / interval_seconds)
+    positions = np.arange(len(speed)) + np.cumsum(rest_samples).astype(int)
+    num_samples = positions[-1] + 1 if len(positions) else 0
+    elapsed_speed = np.zeros(num_samples)
+    elapsed_grade = np.zeros(num_samples)
+    elapsed_speed[positions] = speed
+    elapsed_grade[positions] = grade
+
+    bpm = create_bpm_profile(elapsed_speed, elapsed_grade, avg_speed, avg_bpm, interval_seconds, rng, sport)[positions]
+    if sport == 'cycling':
+        cadence = create_cycling_cadence_profile(speed, grade, avg_cadence, rng)
+    else:
+        cadence = create_cadence_profile(speed, grade, avg_speed, avg_cadence, rng)
+    return bpm, cadence
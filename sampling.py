@@ -0,0 +1,218 @@
+import numpy as np
+
+from geometry import (points_to_arrays, timestamps_to_seconds, seconds_to_timestamps, haversine_distances,
+                      compass_bearings, heading_difference, track_summary)
+
+# Smart recording thresholds (relative to the last recorded point)
+HEADING_THRESHOLD = 12.0  # degrees
+SPEED_THRESHOLD = 0.5  # m/s
+ELEVATION_THRESHOLD = 2.0  # meters
+MAX_RECORDING_INTERVAL = 8  # seconds, a point is always written at least this often
+
+# Auto-pause simulation
+JUNCTION_HEADING = 45.0  # degrees of turn before a point counts as a junction
+JUNCTION_WINDOW = 30.0  # meters of route the turn is summed over
+AUTO_PAUSE_PROBABILITY = 0.15  # chance of stopping at a junction
+AUTO_PAUSE_MIN_SECONDS = 5
+AUTO_PAUSE_MAX_SECONDS = 40
+
+# Smart recorded statistics must stay within this fraction of the 1 Hz track
+SAMPLING_TOLERANCE = 0.01
+
+
+def find_junctions(lat, lon, heading_threshold=JUNCTION_HEADING, window=JUNCTION_WINDOW):
+    """
+    Finds the indices of points where the route turns sharply.
+
+    The heading change is summed over window meters around each point, so a
+    corner that resampling has cut into several smaller turns still counts.
+    Each corner gives one junction, at the point where the summed turn peaks.
+
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param heading_threshold: Minimum change of heading in degrees
+    :param window: Distance in meters the heading change is summed over
+    :return: Numpy array of point indices
+    """
+    if len(lat) < 3:
+        return np.zeros(0, dtype=int)
+    bearings = compass_bearings(lat, lon)
+    turns = np.concatenate(([0.0], (bearings[1:] - bearings[:-1] + 180) % 360 - 180, [0.0]))
+    cumulative_turn = np.cumsum(turns)
+    distance = np.concatenate(([0.0], np.cumsum(haversine_distances(lat, lon))))
+
+    # Signed turn of the points within window / 2 on either side, zig-zags cancel out
+    first = np.searchsorted(distance, distance - window / 2, side='left')
+    last = np.searchsorted(distance, distance + window / 2, side='right') - 1
+    window_turn = np.abs(cumulative_turn[last] - cumulative_turn[first] + turns[first])
+
+    # One junction per run of points above the threshold, in the middle of its largest turn
+    above = np.concatenate(([False], window_turn >= heading_threshold, [False]))
+    starts = np.nonzero(~above[:-1] & above[1:])[0]
+    ends = np.nonzero(above[:-1] & ~above[1:])[0]
+    junctions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        peak = np.nonzero(window_turn[start:end] == window_turn[start:end].max())[0]
+        junctions.append(start + peak[len(peak) // 2])
+    return np.array(junctions, dtype=int)
+
+
+def simulate_auto_pause(lat, lon, stop_probability=AUTO_PAUSE_PROBABILITY,
+                        min_stop=AUTO_PAUSE_MIN_SECONDS, max_stop=AUTO_PAUSE_MAX_SECONDS, rng=None):
+    """
+    Simulates stops at junctions, e.g. waiting at a traffic light.
+
+    Like a device in auto-pause mode nothing is recorded while stopped, so
+    the times after a stop are shifted forward by np.cumsum(stops) and a gap
+    is left in the track.
+
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param stop_probability: Chance of stopping at each junction
+    :param min_stop: Minimum stop duration in seconds
+    :param max_stop: Maximum stop duration in seconds
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :return: Numpy array with the seconds stopped right before each point, 0 for most points
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    junctions = find_junctions(lat, lon)
+    junctions = junctions[junctions < len(lat) - 1]  # the track ends there anyway
+    stopped = junctions[rng.random(len(junctions)) < stop_probability]
+
+    stops = np.zeros(len(lat))
+    stops[stopped + 1] = rng.integers(min_stop, max_stop + 1, size=len(stopped))
+    return stops
+
+
+def smart_record_indices(lat, lon, ele, seconds, stops=None, heading_threshold=HEADING_THRESHOLD,
+                         speed_threshold=SPEED_THRESHOLD, elevation_threshold=ELEVATION_THRESHOLD,
+                         max_interval=MAX_RECORDING_INTERVAL):
+    """
+    Chooses which points a device in smart recording mode would write.
+
+    A point is recorded when the heading, speed or elevation has changed enough
+    since the last recorded point, or when max_interval seconds have passed.
+    The first and last point, and both ends of every auto-pause, are always kept.
+
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param ele: Numpy array of elevations
+    :param seconds: Numpy array of elapsed seconds, including any stops
+    :param stops: Numpy array of seconds stopped before each point, from simulate_auto_pause
+    :param heading_threshold: Heading change in degrees that triggers a point
+    :param speed_threshold: Speed change in m/s that triggers a point
+    :param elevation_threshold: Elevation change in meters that triggers a point
+    :param max_interval: Maximum number of seconds between recorded points
+    :return: Numpy array of indices of the recorded points
+    """
+    num_points = len(lat)
+    if num_points < 3:
+        return np.arange(num_points)
+
+    distances = haversine_distances(lat, lon)
+    dt = np.maximum(np.diff(seconds), 1e-9)
+
+    # Heading and speed at each point, taken from the segment arriving at it, not counting stops
+    if stops is None:
+        stops = np.zeros(num_points)
+    bearings = np.concatenate(([0.0], compass_bearings(lat, lon)))
+    speeds = np.concatenate(([0.0], distances / np.maximum(dt - stops[1:], 1e-9)))
+    paused = stops > 0
+
+    forced = np.zeros(num_points, dtype=bool)
+    forced[[0, 1, -1]] = True
+    forced[:-1] |= paused[1:]
+    forced |= paused
+
+    # Each decision depends on the last recorded point, so this has to be a loop.
+    # It runs on plain floats to keep each iteration cheap.
+    forced, seconds, bearings, speeds, ele = (a.tolist() for a in (forced, seconds, bearings, speeds, ele))
+    keep = [0, 1]
+    last = 1
+    for i in range(2, num_points):
+        if (forced[i]
+                or seconds[i] - seconds[last] >= max_interval
+                or abs((bearings[i] - bearings[last] + 180) % 360 - 180) >= heading_threshold
+                or abs(speeds[i] - speeds[last]) >= speed_threshold
+                or abs(ele[i] - ele[last]) >= elevation_threshold):
+            keep.append(i)
+            last = i
+
+    return np.asarray(keep)
+
+
+def apply_smart_recording(lat, lon, ele, seconds, stops=None, tolerance=SAMPLING_TOLERANCE):
+    """
+    Thins a one-second track the way a device in smart recording mode would.
+
+    Nothing is printed, so it can run in worker threads. Pass the report to
+    format_recording_report to show it.
+
+    :param lat: Numpy array of latitudes
+    :param lon: Numpy array of longitudes
+    :param ele: Numpy array of elevations
+    :param seconds: Numpy array of elapsed seconds, one second apart
+    :param stops: Numpy array of seconds stopped before each point from simulate_auto_pause, None for no stops
+    :param tolerance: Allowed relative deviation of the summary statistics
+    :return: Tuple of (elapsed seconds of every point including stops, indices of the recorded points, report).
+             The report is a dictionary with 'points', 'tolerance', the 'reference' and 'recorded' summaries,
+             'paused_time', 'deviations' (the summary keys that are off by more than tolerance) and
+             'within_tolerance'.
+    """
+    reference = track_summary(lat, lon, seconds)
+
+    if stops is None:
+        stops = np.zeros(len(lat))
+    paused_seconds = np.cumsum(stops)
+    seconds = seconds + paused_seconds
+    keep = smart_record_indices(lat, lon, ele, seconds, stops)
+
+    recorded = track_summary(lat[keep], lon[keep], seconds[keep], paused_seconds[keep])
+    deviations = [key for key in ('distance', 'moving_time', 'avg_speed')
+                  if reference[key] and abs(recorded[key] - reference[key]) > tolerance * reference[key]]
+
+    report = {
+        'points': len(keep),
+        'tolerance': tolerance,
+        'reference': reference,
+        'recorded': recorded,
+        'paused_time': float(paused_seconds[-1]) if len(paused_seconds) else 0.0,
+        'deviations': deviations,
+        'within_tolerance': not deviations
+    }
+    return seconds, keep, report
+
+
+def format_recording_report(report):
+    """
+    Formats the report of apply_smart_recording for printing.
+
+    :param report: Dictionary from apply_smart_recording
+    :return: Report as a string, with one warning line per deviating statistic
+    """
+    reference, recorded = report['reference'], report['recorded']
+    lines = [f'Smart recording kept {report["points"]} points, '
+             f'{report["paused_time"]:.0f} s paused.']
+    for key in report['deviations']:
+        lines.append(f'Warning: smart recorded {key} {recorded[key]:.1f} deviates more than '
+                     f'{report["tolerance"]:.0%} from the 1 Hz track ({reference[key]:.1f}).')
+    return '\n'.join(lines)
+
+
+def smart_record_points(points, timestamps, auto_pause=True, tolerance=SAMPLING_TOLERANCE, rng=None):
+    """
+    Applies smart recording to a track given as lists, as built by the generator scripts.
+
+    :param points: List of dictionaries with 'lat', 'lon', 'ele'
+    :param timestamps: List of datetime objects, one second apart
+    :param auto_pause: Whether to simulate auto-pause stops at junctions
+    :param tolerance: Allowed relative deviation of the summary statistics
+    :param rng: Numpy random Generator, a fresh one is used when None
+    :return: Tuple of (points, timestamps, report), the recorded points and the report from apply_smart_recording
+    """
+    lat, lon, ele = points_to_arrays(points)
+    stops = simulate_auto_pause(lat, lon, rng=rng) if auto_pause else None
+    seconds, keep, report = apply_smart_recording(lat, lon, ele, timestamps_to_seconds(timestamps),
+                                                  stops=stops, tolerance=tolerance)
+    return [points[i] for i in keep.tolist()], seconds_to_timestamps(seconds[keep], timestamps[0]), report
@@ -0,0 +1,201 @@
+from functools import partial
+
+import numpy as np
+
+from geometry import points_to_arrays, haversine_distances, compass_bearings, heading_difference, moving_average
+
+BIN_LENGTH = 10.0  # meters of route per speed bin
+GRADE_WINDOW_BINS = 3  # bins to smooth grade over
+SPEED_WINDOW_BINS = 5  # bins to smooth speed over, so pace doesn't jump between bins
+
+# Running (Minetti et al. 2002 energy cost of running on slopes)
+MAX_RUNNING_GRADE = 0.45
+MAX_DESCENT_FACTOR = 1.2  # runners don't go much faster than flat pace downhill
+RUNNING_LATERAL_ACCEL = 4.0  # m/s^2 in corners
+
+# Cycling power model
+RIDER_MASS = 80.0  # kg, rider and bike
+CDA = 0.32  # m^2, drag area
+CRR = 0.005  # rolling resistance coefficient
+AIR_DENSITY = 1.225  # kg/m^3
+GRAVITY = 9.81  # m/s^2
+MAX_CYCLING_GRADE = 0.3  # steeper grades are treated as elevation data errors
+MAX_CYCLING_SPEED = 16.0  # m/s, riders brake on long descents
+CYCLING_LATERAL_ACCEL = 3.0  # m/s^2 in corners
+
+MIN_SPEED = 0.5  # m/s
+
+
+def route_bins(points, bin_length=BIN_LENGTH):
+    """
+    Splits a route into equal distance bins and calculates grade and curvature per bin.
+
+    :param points: List of dictionaries with 'lat', 'lon', 'ele'
+    :param bin_length: Length of each bin in meters
+    :return: Tuple of (bin edge distances, grade, curvature in rad/m) numpy arrays
+    """
+    lat, lon, ele = points_to_arrays(points)
+    route_distance = np.concatenate(([0.0], np.cumsum(haversine_distances(lat, lon))))
+
+    num_bins = max(int(np.ceil(route_distance[-1] / bin_length)), 1)
+    edges = np.linspace(0, route_distance[-1], num_bins + 1)
+    lengths = np.diff(edges)
+
+    edge_lat = np.interp(edges, route_distance, lat)
+    edge_lon = np.interp(edges, route_distance, lon)
+    edge_ele = np.interp(edges, route_distance, ele)
+
+    grade = moving_average(np.diff(edge_ele) / np.maximum(lengths, 1e-9), GRADE_WINDOW_BINS)
+
+    # Heading change at each interior edge, each bin takes the sharper turn at its ends
+    bearings = compass_bearings(edge_lat, edge_lon)
+    turns = np.radians(heading_difference(bearings[:-1], bearings[1:]))
+    turns = np.concatenate(([0.0], turns, [0.0]))
+    curvature = np.maximum(turns[:-1], turns[1:]) / np.maximum(lengths, 1e-9)
+
+    return edges, grade, curvature
+
+
+def minetti_cost(grade):
+    """
+    Energy cost of running on a slope (Minetti et al. 2002).
+
+    :param grade: Numpy array of grades (rise over run)
+    :return: Numpy array of energy cost in J/(kg m)
+    """
+    i = np.clip(grade, -MAX_RUNNING_GRADE, MAX_RUNNING_GRADE)
+    return 155.4 * i**5 - 30.4 * i**4 - 43.3 * i**3 + 46.3 * i**2 + 19.5 * i + 3.6
+
+
+def running_speed(grade, flat_speed):
+    """
+    Speed at constant metabolic power, given the speed on flat ground.
+
+    :param grade: Numpy array of grades
+    :param flat_speed: Speed on flat ground in m/s
+    :return: Numpy array of speeds in m/s
+    """
+    factor = np.minimum(minetti_cost(0.0) / minetti_cost(grade), MAX_DESCENT_FACTOR)
+    return flat_speed * factor
+
+
+def cycling_power(speed, grade):
+    """
+    Power needed to ride at a speed against gravity, rolling resistance and air drag.
+
+    :param speed: Numpy array of speeds in m/s
+    :param grade: Numpy array of grades
+    :return: Numpy array of power in watts, negative where the rider would have to brake
+    """
+    grade = np.clip(grade, -MAX_CYCLING_GRADE, MAX_CYCLING_GRADE)
+    return 0.5 * AIR_DENSITY * CDA * speed**3 + RIDER_MASS * GRAVITY * (grade + CRR) * speed
+
+
+def cycling_speed(grade, power):
+    """
+    Speed at constant power from gravity, rolling resistance and air drag.
+
+    Solves 0.5 * rho * CdA * v^3 + m * g * (grade + Crr) * v = power with Newton's method.
+    The cubic has exactly one positive root. For v >= sqrt(2|b|/a) and v >= cbrt(2P/a)
+    it is positive, increasing and convex, so starting there the iteration converges
+    monotonically to that root from the right.
+
+    :param grade: Numpy array of grades
+    :param power: Power in watts
+    :return: Numpy array of speeds in m/s
+    """
+    a = 0.5 * AIR_DENSITY * CDA
+    b = RIDER_MASS * GRAVITY * (np.clip(grade, -MAX_CYCLING_GRADE, MAX_CYCLING_GRADE) + CRR)
+    v = np.maximum(np.sqrt(2 * np.abs(b) / a), max(30.0, np.cbrt(2 * power / a)))
+    for _ in range(30):
+        v -= (a * v**3 + b * v - power) / (3 * a * v**2 + b)
+    return np.minimum(v, MAX_CYCLING_SPEED)
+
+
+def cornering_speed(curvature, lateral_accel):
+    """
+    Maximum speed through a corner, v = sqrt(a * r).
+
+    :param curvature: Numpy array of curvatures in rad/m
+    :param lateral_accel: Comfortable lateral acceleration in m/s^2
+    :return: Numpy array of speeds in m/s
+    """
+    return np.sqrt(lateral_accel / np.maximum(curvature, 1e-9))
+
+
+def create_route_speed_profile(points, avg_speed, sport='running', bin_length=BIN_LENGTH):
+    """
+    Creates a per second speed profile that follows the grade and corners of a route.
+
+    The effort (flat speed for running, power for cycling) is chosen so that
+    the whole route is covered at avg_speed, so the profile lasts exactly as
+    long as needed.
+
+    :param points: List of dictionaries with 'lat', 'lon', 'ele'
+    :param avg_speed: Average speed in meters per second
+    :param sport: 'running' or 'cycling'
+    :param bin_length: Length of each route bin in meters
+    :return: Tuple of (speed for each second, distance along the route after each second)
+    :raises ValueError: If avg_speed is outside what the speed model allows on this route
+    """
+    edges, grade, curvature = route_bins(points, bin_length)
+    lengths = np.diff(edges)
+
+    if sport == 'running':
+        # Speed is proportional to flat speed, so the grade factor is only computed once
+        speed_at_effort = partial(np.multiply, running_speed(grade, 1.0))
+        lateral_accel = RUNNING_LATERAL_ACCEL
+        low, high = 0.1, 20.0
+    elif sport == 'cycling':
+        speed_at_effort = partial(cycling_speed, grade)
+        lateral_accel = CYCLING_LATERAL_ACCEL
+        low, high = 1.0, 3000.0
+    else:
+        raise ValueError(f'Unknown sport: {sport}')
+
+    corner_limit = cornering_speed(curvature, lateral_accel)
+    target_time = edges[-1] / avg_speed
+
+    def bin_speeds(effort):
+        speeds = moving_average(speed_at_effort(effort), SPEED_WINDOW_BINS)
+        return np.maximum(np.minimum(speeds, corner_limit), MIN_SPEED)
+
+    # The effort bounds must bracket target_time, or the profile wouldn't have the requested duration
+    fastest = edges[-1] / np.sum(lengths / bin_speeds(high))
+    slowest = edges[-1] / np.sum(lengths / bin_speeds(low))
+    if not slowest <= avg_speed <= fastest:
+        raise ValueError(f'Average speed {avg_speed:.2f} m/s can\'t be reached on this route, '
+                         f'the {sport} model allows {slowest:.2f} to {fastest:.2f} m/s.')
+
+    # Bisect on effort until the route takes target_time
+    for _ in range(50):
+        effort = (low + high) / 2
+        if np.sum(lengths / bin_speeds(effort)) > target_time:
+            low = effort
+        else:
+            high = effort
+    speeds = bin_speeds((low + high) / 2)
+
+    # Time at each bin edge, then distance at each whole second
+    edge_times = np.concatenate(([0.0], np.cumsum(lengths / speeds)))
+    total_seconds = max(int(np.ceil(edge_times[-1])), 1)
+    distances = np.interp(np.arange(1, total_seconds + 1), edge_times, edges)
+    speed_profile = np.diff(np.concatenate(([0.0], distances)))
+
+    return speed_profile, distances
+
+
+def interpolate_track(points, distances):
+    """
+    Places track points at the given distances along a route.
+
+    :param points: List of dictionaries with 'lat', 'lon', 'ele'
+    :param distances: Numpy array of distances along the route in meters
+    :return: Tuple of (lat, lon, ele) numpy arrays with one value per distance
+    """
+    lat, lon, ele = points_to_arrays(points)
+    route_distance = np.concatenate(([0.0], np.cumsum(haversine_distances(lat, lon))))
+
+    return (np.interp(distances, route_distance, lat),
+            np.interp(distances, route_distance, lon),
+            np.interp(distances, route_distance, ele))
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from generation import generate
+
+SEEDS = range(32)
+
+
+def make_route_points():
+    """
+    Builds a fixed zig-zag route of about 2 km with junctions and hills.
+
+    :return: List of dictionaries with 'lat', 'lon', 'ele'
+    """
+    steps = np.arange(40)
+    lat = 59.914428 + steps * 4e-4
+    lon = 10.705898 + np.where(steps % 8 < 4, steps % 4, 4 - steps % 4) * 6e-4
+    ele = 100 + 15 * np.sin(steps / 6)
+    return [{'lat': a, 'lon': b, 'ele': c} for a, b, c in zip(lat.tolist(), lon.tolist(), ele.tolist())]
+
+
+def generate_seed(route_points, seed):
+    return generate({'route_points': route_points, 'seed': seed})
+
+
+def test_threads_match_serial():
+    route_points = make_route_points()
+    serial = [generate_seed(route_points, seed) for seed in SEEDS]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        threaded = list(executor.map(generate_seed, [route_points] * len(SEEDS), SEEDS))
+
+    assert threaded == serial
+
+
+def test_seeds_give_different_tracks():
+    route_points = make_route_points()
+    tracks = [generate_seed(route_points, seed) for seed in SEEDS]
+
+    assert len(set(tracks)) == len(tracks)
+    assert generate_seed(route_points, 0) == tracks[0]
@@ -0,0 +1,262 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from lxml import etree
+
+from geometry import AUTO_PAUSE_SPEED, haversine_distances, track_summary
+
+# Quantiles used to describe and compare distributions
+QUANTILES = np.linspace(0.05, 0.95, 19)
+MIN_GRADE_SPACING = 1.0  # meters, shorter intervals give no meaningful grade
+TPE = '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}'
+FEATURES = ('speed', 'pace', 'hr', 'cad', 'grade', 'spacing', 'interval', 'jitter')
+# Smallest spread each feature is normalized by, in its own unit, so near constant
+# features (e.g. 1 s intervals) don't turn small differences into large distances
+SCALE_FLOORS = {
+    'speed': 1.0,  # m/s
+    'pace': 60.0,  # s/km
+    'hr': 10.0,  # bpm
+    'cad': 10.0,
+    'grade': 0.02,
+    'spacing': 5.0,  # m
+    'interval': 5.0,  # s
+    'jitter': 0.5,  # m/s
+}
+
+
+def parse_times(times):
+    """
+    Parses ISO 8601 timestamps, broken ones become NaT.
+
+    :param times: List of timestamp strings without the trailing 'Z'
+    :return: Numpy array of datetime64[ms]
+    """
+    try:
+        return np.array(times, dtype='datetime64[ms]')
+    except ValueError:
+        parsed = np.full(len(times), np.datetime64('NaT'), dtype='datetime64[ms]')
+        for idx, value in enumerate(times):
+            try:
+                parsed[idx] = np.datetime64(value, 'ms')
+            except ValueError:
+                continue
+        return parsed
+
+
+def load_track(source):
+    """
+    Loads the track points of a GPX file into columnar arrays.
+
+    :param source: Path to a GPX file, or GPX data as bytes (e.g. from generation.generate)
+    :return: Dictionary of numpy arrays 'time' (seconds from the first point), 'lat', 'lon', 'ele', 'hr', 'cad'.
+             Missing values are NaN.
+    """
+    if isinstance(source, bytes):
+        data = source
+    else:
+        with open(source, 'rb') as file:
+            data = file.read()
+    # Some exports have stray bytes before the XML declaration
+    root = etree.fromstring(data[data.index(b'<'):])
+
+    # One pass over the relevant elements, values are stored on the most recent trkpt
+    gpx = f'{{{etree.QName(root).namespace}}}' if etree.QName(root).namespace else ''
+    tags = {gpx + 'ele': 'ele', gpx + 'time': 'time', TPE + 'hr': 'hr', TPE + 'cad': 'cad'}
+    trkpt = gpx + 'trkpt'
+    lat, lon = [], []
+    columns = {'ele': [], 'time': [], 'hr': [], 'cad': []}
+    for elem in root.iter(trkpt, *tags):
+        if elem.tag == trkpt:
+            lat.append(elem.get('lat'))
+            lon.append(elem.get('lon'))
+            for values in columns.values():
+                values.append(None)
+        elif lat:
+            columns[tags[elem.tag]][-1] = elem.text
+
+    ele, hr, cad = ([value or 'nan' for value in columns[name]] for name in ('ele', 'hr', 'cad'))
+    times = [(value or 'NaT').rstrip('Z') for value in columns['time']]
+
+    time = parse_times(times)
+    valid = ~np.isnat(time)
+    seconds = (time - time[valid][0]).astype(float) / 1000 if valid.any() else np.full(len(time), np.nan)
+    seconds[~valid] = np.nan
+
+    return {
+        'time': seconds,
+        'lat': np.array(lat, dtype=float),
+        'lon': np.array(lon, dtype=float),
+        'ele': np.array(ele, dtype=float),
+        'hr': np.array(hr, dtype=float),
+        'cad': np.array(cad, dtype=float)
+    }
+
+
+def track_features(track):
+    """
+    Calculates per sample features of a track.
+
+    :param track: Dictionary of arrays from load_track
+    :return: Dictionary with one numpy array per name in FEATURES
+    """
+    spacing = haversine_distances(track['lat'], track['lon'])
+    interval = np.diff(track['time'])
+    speed = np.divide(spacing, interval, out=np.full_like(spacing, np.nan), where=interval > 0)
+    moving = speed > AUTO_PAUSE_SPEED
+
+    grade = np.divide(np.diff(track['ele']), spacing, out=np.full_like(spacing, np.nan),
+                      where=spacing > MIN_GRADE_SPACING)
+
+    return {
+        'speed': speed[moving],
+        'pace': 1000 / speed[moving],  # seconds per km
+        'hr': track['hr'],
+        'cad': track['cad'],
+        'grade': grade[moving],
+        'spacing': spacing,
+        'interval': interval,
+        'jitter': np.abs(np.diff(speed))  # change of speed between consecutive intervals
+    }
+
+
+def feature_quantiles(features):
+    """
+    Describes every feature by its quantiles.
+
+    :param features: Dictionary of arrays from track_features
+    :return: Dictionary mapping feature name to len(QUANTILES) quantiles, all NaN when the feature is missing
+    """
+    quantiles = {}
+    for name in FEATURES:
+        values = features[name][np.isfinite(features[name])]
+        quantiles[name] = np.quantile(values, QUANTILES) if len(values) else np.full(len(QUANTILES), np.nan)
+    return quantiles
+
+
+def compare_quantiles(generated, reference):
+    """
+    Compares feature distributions of a generated and a reference track.
+
+    The distance per feature is the mean absolute difference between their
+    quantiles (an approximation of the Wasserstein-1 distance), divided by the
+    5-95% range of the reference, at least SCALE_FLOORS, so features can be averaged.
+
+    :param generated: Dictionary from feature_quantiles
+    :param reference: Dictionary from feature_quantiles
+    :return: Dictionary mapping feature name to normalized distance, NaN when either track lacks the feature
+    """
+    generated = np.array([generated[name] for name in FEATURES])
+    reference = np.array([reference[name] for name in FEATURES])
+
+    # The first and last quantiles are the 5% and 95% ones
+    floors = np.array([SCALE_FLOORS[name] for name in FEATURES])
+    scale = np.maximum(reference[:, -1] - reference[:, 0], floors)
+    distances = np.mean(np.abs(generated - reference), axis=1) / scale
+
+    return dict(zip(FEATURES, distances.tolist()))
+
+
+def score_track(source, reference_quantiles):
+    """
+    Scores a single track against reference quantiles.
+
+    :param source: Path to a GPX file, or GPX data as bytes
+    :param reference_quantiles: Dictionary from feature_quantiles
+    :return: Dictionary with 'summary', 'distances' and 'score' (mean of the available distances)
+    """
+    track = load_track(source)
+    distances = compare_quantiles(feature_quantiles(track_features(track)), reference_quantiles)
+    available = [value for value in distances.values() if np.isfinite(value)]
+
+    return {
+        'summary': track_summary(track['lat'], track['lon'], track['time']),
+        'distances': distances,
+        'score': float(np.mean(available)) if available else float('nan')
+    }
+
+
+def load_features(source):
+    """
+    Loads a track and calculates its features and summary, for pooled scoring.
+
+    :param source: Path to a GPX file, or GPX data as bytes
+    :return: Tuple of (dictionary from track_features, dictionary from track_summary)
+    """
+    track = load_track(source)
+    return track_features(track), track_summary(track['lat'], track['lon'], track['time'])
+
+
+def evaluate(sources, reference, pooled=False, processes=None):
+    """
+    Scores generated tracks against a reference recording.
+
+    :param sources: List of paths to GPX files, or GPX data as bytes
+    :param reference: Path to the reference GPX file, or GPX data as bytes
+    :param pooled: Score the features of all tracks together as one distribution instead of per track
+    :param processes: Number of worker processes to load and score tracks with, None works in this process
+    :return: List of results from score_track, a single one when pooled
+    """
+    if not sources:
+        raise ValueError('No tracks to evaluate.')
+    reference_quantiles = feature_quantiles(track_features(load_track(reference)))
+
+    if processes:
+        with ProcessPoolExecutor(processes) as executor:
+            chunksize = max(len(sources) // (processes * 4), 1)
+            if pooled:
+                loaded = list(executor.map(load_features, sources, chunksize=chunksize))
+            else:
+                return list(executor.map(score_track, sources, [reference_quantiles] * len(sources),
+                                         chunksize=chunksize))
+    elif pooled:
+        loaded = [load_features(source) for source in sources]
+    else:
+        return [score_track(source, reference_quantiles) for source in sources]
+
+    features, summaries = zip(*loaded)
+    pooled_features = {name: np.concatenate([f[name] for f in features]) for name in FEATURES}
+    distances = compare_quantiles(feature_quantiles(pooled_features), reference_quantiles)
+    available = [value for value in distances.values() if np.isfinite(value)]
+    return [{
+        'summary': {key: float(np.mean([s[key] for s in summaries])) for key in summaries[0]},
+        'distances': distances,
+        'score': float(np.mean(available)) if available else float('nan')
+    }]
+
+
+def format_report(names, results):
+    """
+    Formats evaluation results as a compact text table.
+
+    :param names: Name of each result, e.g. the file name
+    :param results: List of results from evaluate
+    :return: Report as a string
+    """
+    header = f'{"track":<30}{"points":>7}{"km":>8}{"moving":>9}{"m/s":>6}{"score":>7}  ' + ' '.join(
+        f'{name:>8}' for name in FEATURES)
+    lines = [header]
+    for name, result in zip(names, results):
+        summary = result['summary']
+        lines.append(
+            f'{str(name)[-30:]:<30}{summary["points"]:>7.0f}{summary["distance"] / 1000:>8.2f}'
+            f'{summary["moving_time"] / 60:>8.1f}m{summary["avg_speed"]:>6.2f}{result["score"]:>7.2f}  '
+            + ' '.join(f'{result["distances"][feature]:>8.2f}' for feature in FEATURES))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare generated GPX tracks with a real recording.')
+    parser.add_argument('reference', help='Reference GPX file, e.g. garmin_cycling_HR.gpx')
+    parser.add_argument('tracks', nargs='+', help='Generated GPX files')
+    parser.add_argument('--pooled', action='store_true', help='Score all tracks as one distribution')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes')
+    args = parser.parse_args()
+
+    results = evaluate(args.tracks, args.reference, pooled=args.pooled, processes=args.processes)
+    names = ['pooled'] if args.pooled else args.tracks
+    print(format_report(names, results))
+
+
+if __name__ == "__main__":
+    main()